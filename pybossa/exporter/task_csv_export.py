@@ -17,24 +17,90 @@
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 # Cache global variables for timeouts
 
-import tempfile
+import cStringIO
 import json
+from backports.functools_lru_cache import lru_cache
 from flask import url_for, safe_join, send_file, redirect
 from pybossa.uploader import local
 from pybossa.exporter.csv_export import CsvExporter
 from pybossa.core import uploader, task_repo
-from pybossa.util import UnicodeWriter
+from pybossa.util import DirectUnicodeWriter
 from export_helpers import browse_tasks_export
 
+try:
+    # Optional compiled fast path for the per-cell helpers; built
+    # from _csv_fast.pyx when Cython is available at install time.
+    from pybossa.exporter import _csv_fast
+except ImportError:
+    _csv_fast = None
+
+
+@lru_cache(maxsize=1024)
+def _flatten_schema(schema, prefix):
+    """Flatten a nested schema tuple, as built by
+    :meth:`TaskCsvExporter._schema_signature`, into prefixed keys.
+
+    The schema tuple carries only the key layout of a row, so the
+    flattening is a pure function of hashable arguments and rows
+    sharing a layout resolve to the cached result.
+
+    Info keys are user-supplied JSON and may not be coercible to
+    a byte-string header; those keys and their subtrees are
+    skipped, as they were by the bare except in the old recursive
+    get_keys, instead of failing the whole export.
+    """
+    keys = []
+    stack = [(schema, prefix)]
+    while stack:
+        current, current_prefix = stack.pop()
+        for key, nested in current:
+            try:
+                full_key = str(current_prefix + key)
+            except UnicodeEncodeError:
+                continue
+            keys.append(full_key)
+            if nested is not None:
+                stack.append((nested, full_key + '__'))
+    return tuple(keys)
+
+
+def _row_as_dict(row):
+    """Convert a SQLAlchemy result row to a dict, preferring the
+    C-level _asdict when the row type provides it over iterating
+    the row's keys in Python.
+    """
+    asdict = getattr(row, '_asdict', None)
+    if asdict is not None:
+        return asdict()
+    return dict(row)
+
+
 class TaskCsvExporter(CsvExporter):
     """CSV Exporter for exporting ``Task``s and ``TaskRun``s
     for a project.
     """
 
+    @classmethod
+    def _schema_signature(cls, row):
+        """Build a hashable signature of the nested key layout
+        of a row, so that rows sharing a schema can share the
+        flattened keys computed by :meth:`get_keys`.
+        """
+        sig = []
+        for key in row.keys():
+            value = row[key]
+            if isinstance(value, dict):
+                sig.append((key, cls._schema_signature(value)))
+            else:
+                sig.append((key, None))
+        return tuple(sorted(sig))
+
     @classmethod
     def get_keys(self, row, ty='', parent_key=''):
-        """Recursively get keys from a dictionary.
-        Nested keys are prefixed with their parents key.
+        """Get keys from a dictionary. Nested keys are prefixed
+        with their parents key. The flattening runs on the row's
+        schema signature through a memoized helper, so rows that
+        share a layout are only flattened once.
         Ex:
             >>> row = {"a": {"nested_x": "N"},
             ...        "b": 1,
@@ -57,19 +123,18 @@ class TaskCsvExporter(CsvExporter):
         else:
             _prefix = '{}__{}'.format(ty, parent_key)
 
-        keys = []
-        for key in row.keys():
-            keys = keys + [_prefix + key]
-            try:
-                keys = keys + self.get_keys(row[key], _prefix + key)
-            except: pass
-
-        return [str(key) for key in keys]
+        return list(_flatten_schema(self._schema_signature(row), _prefix))
 
-    @classmethod
-    def get_value(cls, row, key):
-        """Recursively get value from a dictionary by
-        passing an arbitrarily long list of nested keys.
+    @staticmethod
+    def get_value(row, key):
+        """Get a value from a dictionary by passing a
+        ``'__'``-separated chain of nested keys. The lookup
+        is done iteratively with an explicit stack, trying
+        every split of the key so that dictionary keys which
+        themselves contain ``'__'`` are still found. The key
+        is split once up front and the stack tracks offsets
+        into the segment list, so no level re-splits or
+        re-joins the remainder of the key.
         Ex:
             >>> row = {"a": {"nested_x": "N"},
             ...        "b": 1,
@@ -81,44 +146,121 @@ class TaskCsvExporter(CsvExporter):
             >>> exp.get_value(row, 'c__nested_y__double_nested'])
             'www.example.com'
         """
+        if _csv_fast is not None:
+            return _csv_fast.get_value(row, key)
         if not isinstance(row, dict):
             return None
         if key in row:
             return row[key]
         splits = key.split('__')
-        for i in range(1, len(splits)):
-            key1 = '__'.join(splits[:i])
-            if key1 in row:
-                key2 = '__'.join(splits[i:])
-                val = cls.get_value(row[key1], key2)
+        n = len(splits)
+        # suffixes[j] is the remainder of the key after j segments
+        suffixes = ['__'.join(splits[j:]) for j in range(n)]
+        stack = [(row, 0)]
+        while stack:
+            current, j = stack.pop()
+            if not isinstance(current, dict):
+                continue
+            if j and suffixes[j] in current:
+                val = current[suffixes[j]]
                 if isinstance(val, list):
                     return json.dumps(val)
                 if val is not None:
                     return val
+                continue
+            for i in reversed(range(j + 1, n)):
+                key1 = '__'.join(splits[j:i])
+                if key1 in current:
+                    stack.append((current[key1], i))
 
     @staticmethod
     def process_filtered_row(row):
         """Normalizes a row returned from a SQL query to
         the same format as that of merging joined domain
-        objects.
-        """
-        def set_nested_value(row, keys, value):
-            for key in keys[:-1]:
-                row = row.setdefault(key, {})
-            row[keys[-1]] = value
+        objects, nesting prefixed task/user columns in a
+        single pass.
 
+        Only the nested representation is kept, so list values
+        under the joined columns (e.g. a task info that is a
+        JSON array) are serialized by get_value as JSON rather
+        than rendered as Python reprs like the flat duplicates
+        used to be.
+        """
         new_row = {}
         for k, v in row.iteritems():
             key_split = k.split('__', 1)
             if len(key_split) > 1 and key_split[0] in ('task', 'user'):
-                set_nested_value(new_row, key_split, v)
-            new_row[k] = v
+                new_row.setdefault(key_split[0], {})[key_split[1]] = v
+            else:
+                new_row[k] = v
 
         return new_row
 
-    def _format_csv_row(self, row, headers):
-        return [self.get_value(row, header.split('__', 1)[1])
-                for header in headers]
+    def _format_csv_row(self, row, header_keys):
+        """Format a row using header keys that have already had
+        their table prefix split off, so headers are not re-split
+        for every row.
+        """
+        if _csv_fast is not None:
+            return _csv_fast.format_row(row, header_keys)
+        return [self.get_value(row, key) for key in header_keys]
+
+    @staticmethod
+    def _compile_cell_getter(key):
+        """Build a getter specialized for one header key.
+
+        Headers are fixed for the duration of an export, so all the
+        splitting and joining of the key happens once here; the
+        returned closure resolves the value with dict operations
+        only, following the same search order as :meth:`get_value`.
+        """
+        splits = key.split('__')
+        n = len(splits)
+        suffixes = ['__'.join(splits[j:]) for j in range(n)]
+        # candidates[j] holds the (prefix, next offset) pairs that
+        # get_value would probe at segment offset j, in pop order
+        candidates = [[('__'.join(splits[j:i]), i)
+                       for i in reversed(range(j + 1, n))]
+                      for j in range(n)]
+
+        def getter(row, _dumps=json.dumps):
+            if key in row:
+                return row[key]
+            stack = [(row, 0)]
+            while stack:
+                current, j = stack.pop()
+                if not isinstance(current, dict):
+                    continue
+                if j and suffixes[j] in current:
+                    val = current[suffixes[j]]
+                    if isinstance(val, list):
+                        return _dumps(val)
+                    if val is not None:
+                        return val
+                    continue
+                for key1, i in candidates[j]:
+                    if key1 in current:
+                        stack.append((current[key1], i))
+            return None
+
+        return getter
+
+    def _compile_row_formatter(self, header_keys):
+        """Build a row formatter specialized to this export's
+        headers. When the compiled fast path is available it is
+        preferred; otherwise one pre-compiled getter per header
+        replaces the generic get_value dispatch in the row loop.
+        """
+        if _csv_fast is not None:
+            def format_row(row):
+                return _csv_fast.format_row(row, header_keys)
+            return format_row
+
+        getters = [self._compile_cell_getter(key) for key in header_keys]
+
+        def format_row(row):
+            return [getter(row) for getter in getters]
+        return format_row
 
     @staticmethod
     def flatten(key_value_pairs, key_prefix='', return_value=None):
@@ -134,26 +276,68 @@ class TaskCsvExporter(CsvExporter):
             for kk, vv, in iterator:
                 yield kk, vv
 
+    # Flush the in-memory buffer to the consumer once it holds at
+    # least this many bytes, so that many small rows coalesce into
+    # a single chunk instead of one write per row.
+    CSV_BUFFER_SIZE = 1 << 20
+
+    # Number of formatted rows handed to the writer per writerows
+    # call, pushing the write loop down into the csv module.
+    CSV_BATCH_ROWS = 1000
+
     def _get_csv_with_filters(self, out, writer, table, project_id,
                               expanded, filters, disclose_gold):
-        objs = browse_tasks_export(table, project_id, expanded, filters, disclose_gold)
-        rows = [obj for obj in objs]
-        # for row in rows:
-        #     if row['info']:
-        #         info = dict(TaskCsvExporter.flatten(row['info'].iteritems()))
-        #         row['info'].update(info)
-
-        headers = self._get_all_headers(objs=rows,
+        # First pass: stream the result set once only to collect the
+        # union of headers. The schema cache keeps this cheap (get_keys
+        # runs once per distinct row layout) and nothing is pinned in
+        # memory, unlike materializing the rows up front.
+        objs = browse_tasks_export(table, project_id, expanded, filters,
+                                   disclose_gold)
+        headers = self._get_all_headers(objs=objs,
                                         expanded=expanded,
                                         table=table)
         writer.writerow(headers)
+        header_keys = [header.split('__', 1)[1] for header in headers]
+        format_row = self._compile_row_formatter(header_keys)
 
-        for row in rows:
-            row = self.process_filtered_row(dict(row))
-            writer.writerow(self._format_csv_row(row, headers))
+        # Second pass: re-run the query and stream the rows through
+        # the writer in batches. A row committed between the two
+        # passes with keys outside the collected union exports only
+        # the values under known headers, as before.
+        objs = browse_tasks_export(table, project_id, expanded, filters,
+                                   disclose_gold)
+        batch = []
+        batch_bytes = 0
+        for row in objs:
+            row = self.process_filtered_row(_row_as_dict(row))
+            cells = format_row(row)
+            # Bound the unwritten batch by bytes as well as rows, so a
+            # run of rows with large info payloads cannot pile up a
+            # full CSV_BATCH_ROWS batch before a flush. Dict cells are
+            # serialized here so their real size counts; the writer
+            # passes the resulting strings through unchanged.
+            for i, cell in enumerate(cells):
+                if isinstance(cell, dict):
+                    cell = json.dumps(cell)
+                    cells[i] = cell
+                if isinstance(cell, basestring):
+                    batch_bytes += len(cell)
+            batch.append(cells)
+            if (len(batch) >= self.CSV_BATCH_ROWS or
+                    batch_bytes >= self.CSV_BUFFER_SIZE):
+                writer.writerows(batch)
+                del batch[:]
+                batch_bytes = 0
+                if out.tell() >= self.CSV_BUFFER_SIZE:
+                    data = out.getvalue()
+                    out.truncate(0)
+                    yield data
+        if batch:
+            writer.writerows(batch)
 
-        out.seek(0)
-        yield out.read()
+        data = out.getvalue()
+        if data:
+            yield data
 
     def _get_all_headers(self, objs, expanded, table=None):
         """Construct headers to **guarantee** that all headers
@@ -168,6 +352,12 @@ class TaskCsvExporter(CsvExporter):
         :param from_obj: does ``objs`` iterable contain
             domain objects. If it does then different methods
             can be used.
+
+        Rows within an export almost always share the same
+        layout, so get_keys resolves repeated layouts from the
+        bounded lru_cache on the flattening helper; signatures
+        derived from user-supplied info keys cannot grow an
+        unbounded per-instance cache on the exporter singleton.
         """
         headers = set()
 
@@ -178,8 +368,8 @@ class TaskCsvExporter(CsvExporter):
         return headers
 
     def _respond_csv(self, ty, project_id, expanded=False, filters=None, disclose_gold=False):
-        out = tempfile.TemporaryFile()
-        writer = UnicodeWriter(out)
+        out = cStringIO.StringIO()
+        writer = DirectUnicodeWriter(out)
 
         return self._get_csv_with_filters(
                     out, writer, ty, project_id, expanded, filters, disclose_gold)
@@ -193,7 +383,7 @@ class TaskCsvExporter(CsvExporter):
         """
         filename = self.download_name(project, ty)
         self.delete_existing_zip(project, ty)
-        self._make_zip(project, ty, expanded)
+        self.make_zip(project, ty, expanded)
         if isinstance(uploader, local.LocalUploader):
             filepath = self._download_path(project)
             res = send_file(filename_or_fp=safe_join(filepath, filename),
@@ -215,6 +405,3 @@ class TaskCsvExporter(CsvExporter):
         obj_generator = self._respond_csv(obj, project.id, expanded, filters, disclose_gold)
         return self._make_zipfile(
                 project, obj, file_format, obj_generator, expanded)
-
-    def _make_zip(self, project, obj, expanded=False, filters=None):
-        self.make_zip(self, project, obj, expanded, filters)
@@ -33,6 +33,9 @@ TASKRUN_GOLD_FIELDS = [
     'calibration'
 ]
 
+_ALLOWED_USER_ATTRS = frozenset(['name', 'fullname', 'user_type', 'created',
+                                 'email_addr', 'admin', 'subadmin'])
+
 def remove_task_gold_fields(task_dict):
     if not task_dict:
         return
@@ -54,28 +57,19 @@ class TaskJsonExporter(JsonExporter):
     @staticmethod
     def merge_objects(t):
         """Merge joined objects into a single dictionary."""
-        obj_dict = {}
-
-        try:
-            obj_dict = t.dictize()
-        except:
-            pass
-
-        try:
-            task = t.task.dictize()
-            obj_dict['task'] = task
-        except:
-            pass
-
-        try:
-            user = t.user.dictize()
-            user['user_type'] = user.get('info', {}).get('metadata', {}).get('user_type')
-            allowed_attributes = ['name', 'fullname', 'user_type', 'created',
-                                  'email_addr', 'admin', 'subadmin']
-            user = {k: v for (k, v) in user.iteritems() if k in allowed_attributes}
-            obj_dict['user'] = user
-        except:
-            pass
+        obj_dict = t.dictize() if hasattr(t, 'dictize') else {}
+
+        task = getattr(t, 'task', None)
+        if task is not None:
+            obj_dict['task'] = task.dictize()
+
+        user = getattr(t, 'user', None)
+        if user is not None:
+            user = user.dictize()
+            metadata = (user.get('info') or {}).get('metadata') or {}
+            user['user_type'] = metadata.get('user_type')
+            obj_dict['user'] = {k: v for (k, v) in user.iteritems()
+                                if k in _ALLOWED_USER_ATTRS}
 
         return obj_dict
 
@@ -102,10 +96,12 @@ class TaskJsonExporter(JsonExporter):
 
     def gen_json(self, obj, project_id, expanded=False, disclose_gold=False):
         if obj == 'task':
-            query_filter = task_repo.filter_tasks_by
+            rows = task_repo.filter_tasks_by(project_id=project_id,
+                                             yielded=True)
             remove_gold = remove_task_gold_fields
         elif obj == 'task_run':
-            query_filter = task_repo.filter_task_runs_by
+            rows = task_repo.filter_task_runs_for_export(project_id,
+                                                         expanded=expanded)
             remove_gold = remove_taskrun_gold_fields
         else:
             return
@@ -114,7 +110,7 @@ class TaskJsonExporter(JsonExporter):
         sep = ", "
         yield "["
 
-        for i, tr in enumerate(query_filter(project_id=project_id, yielded=True), 1):
+        for i, tr in enumerate(rows, 1):
             if expanded:
                 item = self.merge_objects(tr)
             else:
@@ -162,7 +158,7 @@ class TaskJsonExporter(JsonExporter):
         generate one on the fly and upload it."""
         filename = self.download_name(project, ty)
         self.delete_existing_zip(project, ty)
-        self._make_zip(project, ty, expanded)
+        self.make_zip(project, ty, expanded)
         if isinstance(uploader, local.LocalUploader):
             filepath = self._download_path(project)
             res = send_file(filename_or_fp=safe_join(filepath, filename),
@@ -184,6 +180,3 @@ class TaskJsonExporter(JsonExporter):
         obj_generator = self._respond_json(obj, project.id, expanded, filters, disclose_gold)
         return self._make_zipfile(
                 project, obj, file_format, obj_generator, expanded)
-
-    def _make_zip(self, project, obj, expanded=False):
-        self.make_zip(self, project, obj, expanded)
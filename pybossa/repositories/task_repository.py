@@ -18,6 +18,7 @@
 
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import cast, Date
+from sqlalchemy.orm import joinedload
 
 from pybossa.repositories import Repository
 from pybossa.model.task import Task
@@ -145,6 +146,19 @@ class TaskRepository(Repository):
         return self._filter_by(TaskRun, limit, offset, yielded, last_id,
                               fulltextsearch, desc, **filters)
 
+    def filter_task_runs_for_export(self, project_id, expanded=False):
+        """Stream all task runs of a project for an export.
+
+        When the export is expanded, the joined task and user are
+        eager-loaded in the same query so that accessing them does
+        not issue one lazy SELECT per task run.
+        """
+        query = self.db.session.query(TaskRun).\
+            filter(TaskRun.project_id == project_id)
+        if expanded:
+            query = query.options(joinedload('task'), joinedload('user'))
+        return query.order_by(TaskRun.id).yield_per(1000)
+
     def count_task_runs_with(self, **filters):
         query_args, _, _, _ = self.generate_query_from_keywords(TaskRun, **filters)
         return self.db.session.query(TaskRun).filter(*query_args).count()
@@ -471,6 +471,44 @@ class UnicodeWriter:
             self.writerow(row)
 
 
+class DirectUnicodeWriter(UnicodeWriter):
+
+    """A CSV writer which writes rows straight to an in-memory
+    byte stream "f".
+
+    UnicodeWriter routes every row through an intermediate queue
+    and a decode/re-encode cycle before copying it to the target
+    stream. When the target is already a memory buffer that cycle
+    is an identity transform on the UTF-8 bytes produced by the
+    csv module, so this writer feeds the csv writer the stream
+    directly and skips the extra copies.
+    """
+
+    def __init__(self, f, dialect=csv.excel, **kwds):
+        """Init method."""
+        self.writer = csv.writer(f, dialect=dialect, **kwds)
+        self.stream = f
+
+    @staticmethod
+    def _convert_cell(s):
+        if isinstance(s, unicode):
+            return s.encode("utf-8")
+        if isinstance(s, str):
+            return s
+        if isinstance(s, dict):
+            return json.dumps(s)
+        return str(s)
+
+    def writerow(self, row):
+        """Write row."""
+        self.writer.writerow([self._convert_cell(s) for s in row])
+
+    def writerows(self, rows):
+        """Write rows with a single C-level csv call."""
+        convert = self._convert_cell
+        self.writer.writerows([[convert(s) for s in row] for row in rows])
+
+
 def get_user_signup_method(user):
     """Return which OAuth sign up method the user used."""
     msg = u'Sorry, there is already an account with the same e-mail.'
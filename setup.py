@@ -1,5 +1,22 @@
+import os.path
 from setuptools import setup, find_packages
 
+_CSV_FAST_PYX = 'pybossa/exporter/_csv_fast.pyx'
+
+try:
+    # Optional: compile the CSV exporter fast path when Cython is
+    # available. pybossa falls back to the pure Python implementation
+    # when the extension is not built. The existence check keeps
+    # installs working from trees that do not carry the .pyx source.
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    if os.path.exists(_CSV_FAST_PYX):
+        ext_modules = cythonize([_CSV_FAST_PYX])
+    else:
+        ext_modules = []
+
 requirements = [
     "alembic==0.9.10",
     "arrow==0.15.5",
@@ -165,6 +182,7 @@ setup(
     name = 'pybossa',
     version = '2.11.0',
     packages = find_packages(),
+    ext_modules = ext_modules,
     install_requires = requirements,
     # only needed when installing directly from setup.py (PyPi, eggs?) and pointing to e.g. a git repo.
     # Keep in mind that dependency_links are not used when installing with requirements.txt
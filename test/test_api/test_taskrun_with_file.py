@@ -26,6 +26,16 @@ from pybossa.model.task_run import TaskRun
 from pybossa.cloud_store_api.s3 import s3_upload_from_string
 from pybossa.encryption import AESWithGCM
 
+EXPECTED_URL = 'https://{host}/{bucket}/{project_id}/{task_id}/{user_id}/{filename}'
+
+
+def expected_url(test, task, filename):
+    """Build the upload URL the API is expected to return."""
+    return EXPECTED_URL.format(host=test.host, bucket=test.bucket,
+                               project_id=task.project_id, task_id=task.id,
+                               user_id=task.project.owner.id,
+                               filename=filename)
+
 
 class TestTaskrunWithFile(TestAPI):
 
@@ -87,15 +97,7 @@ class TestTaskrunWithFile(TestAPI):
             set_content.assert_called()
             res = json.loads(success.data)
             url = res['info']['test__upload_url']
-            args = {
-                'host': self.host,
-                'bucket': self.bucket,
-                'project_id': project.id,
-                'task_id': task.id,
-                'user_id': project.owner.id,
-                'filename': 'hello.txt'
-            }
-            expected = 'https://{host}/{bucket}/{project_id}/{task_id}/{user_id}/{filename}'.format(**args)
+            expected = expected_url(self, task, 'hello.txt')
             assert url == expected, url
 
     @with_context
@@ -151,15 +153,7 @@ class TestTaskrunWithFile(TestAPI):
             set_content.assert_called()
             res = json.loads(success.data)
             url = res['info']['test__upload_url']
-            args = {
-                'host': self.host,
-                'bucket': self.bucket,
-                'project_id': project.id,
-                'task_id': task.id,
-                'user_id': project.owner.id,
-                'filename': 'hello.txt'
-            }
-            expected = 'https://{host}/{bucket}/{project_id}/{task_id}/{user_id}/{filename}'.format(**args)
+            expected = expected_url(self, task, 'hello.txt')
             assert url == expected, url
 
     @with_context
@@ -238,15 +232,7 @@ class TestTaskrunWithSensitiveFile(TestAPI):
             res = json.loads(success.data)
             assert len(res['info']) == 1
             url = res['info']['pyb_answer_url']
-            args = {
-                'host': self.host,
-                'bucket': self.bucket,
-                'project_id': project.id,
-                'task_id': task.id,
-                'user_id': project.owner.id,
-                'filename': 'pyb_answer.json'
-            }
-            expected = 'https://{host}/{bucket}/{project_id}/{task_id}/{user_id}/{filename}'.format(**args)
+            expected = expected_url(self, task, 'pyb_answer.json')
             assert url == expected, url
 
             aes = AESWithGCM('testkey')
@@ -263,15 +249,7 @@ class TestTaskrunWithSensitiveFile(TestAPI):
             content = aes.decrypt(args[0].read())
             actual_content = json.loads(content)
 
-            args = {
-                'host': self.host,
-                'bucket': self.bucket,
-                'project_id': project.id,
-                'task_id': task.id,
-                'user_id': project.owner.id,
-                'filename': 'hello.txt'
-            }
-            expected = 'https://{host}/{bucket}/{project_id}/{task_id}/{user_id}/{filename}'.format(**args)
+            expected = expected_url(self, task, 'hello.txt')
             assert actual_content['test__upload_url'] == expected
             assert actual_content['another_field'] == 42
 
@@ -303,13 +281,5 @@ class TestTaskrunWithSensitiveFile(TestAPI):
             set_content.assert_called()
             res = json.loads(success.data)
             url = res['info']['pyb_answer_url']
-            args = {
-                'host': self.host,
-                'bucket': self.bucket,
-                'project_id': project.id,
-                'task_id': task.id,
-                'user_id': project.owner.id,
-                'filename': 'pyb_answer.json'
-            }
-            expected = 'https://{host}/{bucket}/{project_id}/{task_id}/{user_id}/{filename}'.format(**args)
+            expected = expected_url(self, task, 'pyb_answer.json')
             assert url == expected, url
@@ -17,12 +17,16 @@
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 """This module tests the TaskCsvExporter class."""
 
+import csv
+import json
+from StringIO import StringIO
 from default import Test, with_context
 from pybossa.exporter.task_csv_export import TaskCsvExporter
 from mock import patch
 from codecs import encode
 from pybossa.exporter.csv_export import CsvExporter
 from pybossa.exporter.json_export import JsonExporter
+from pybossa.exporter.task_json_export import TaskJsonExporter
 from factories import ProjectFactory, UserFactory, TaskFactory, TaskRunFactory
 from werkzeug.datastructures import FileStorage
 from pybossa.uploader.local import LocalUploader
@@ -89,6 +93,56 @@ class TestTaskCsvExporter(Test):
         assert chinese_value == u'\u4E2D\u570B\u7684 \u82F1\u8A9E \u7F8E\u570B\u4EBA'
         assert smart_quotes_value == u'\u201CHello\u201D'
     
+    @with_context
+    def test_task_csv_exporter_process_filtered_row(self):
+        """Test that process_filtered_row nests joined task/user
+        columns without keeping the flat duplicates, and that
+        list values under them export as JSON."""
+        exporter = TaskCsvExporter()
+
+        row = {'id': 1,
+               'info': {'answer': u'x'},
+               'task__id': 2,
+               'task__info': [u'x'],
+               'user__name': u'jane'}
+        processed = exporter.process_filtered_row(row)
+
+        assert processed['task'] == {'id': 2, 'info': [u'x']}
+        assert processed['user'] == {'name': u'jane'}
+        assert 'task__id' not in processed
+        assert 'task__info' not in processed
+
+        headers = ['task_run__id', 'task_run__info__answer',
+                   'task_run__task__id', 'task_run__task__info',
+                   'task_run__user__name']
+        header_keys = [h.split('__', 1)[1] for h in headers]
+        values = exporter._format_csv_row(processed, header_keys)
+
+        # List values under joined columns are serialized as JSON;
+        # before the single-pass rewrite the flat duplicate hit the
+        # top-level fast path and they were rendered as Python reprs.
+        assert values == [1, u'x', 2, json.dumps([u'x']), u'jane'], values
+
+    @with_context
+    @patch('pybossa.exporter.task_csv_export.browse_tasks_export')
+    def test_task_csv_exporter_streams_csv(self, browse):
+        """Test that the streamed CSV chunks concatenate to a
+        well-formed CSV with the union of all row headers."""
+        rows = [{'id': 1, 'info': {'foo': u'a'}},
+                {'id': 2, 'info': {'bar': u'b'}}]
+        browse.side_effect = lambda *args, **kwargs: iter([dict(r) for r in rows])
+
+        exporter = TaskCsvExporter()
+        data = ''.join(exporter._respond_csv('task', 1, filters={}))
+
+        parsed = [row for row in csv.reader(StringIO(data))]
+        assert parsed[0] == ['task__id', 'task__info',
+                             'task__info__bar', 'task__info__foo'], parsed[0]
+        assert parsed[1] == ['1', '{"foo": "a"}', 'None', 'a'], parsed[1]
+        assert parsed[2] == ['2', '{"bar": "b"}', 'b', 'None'], parsed[2]
+        # The result set is streamed twice: once for headers, once for rows.
+        assert browse.call_count == 2
+
     @with_context
     def test_task_csv_exporter_flatten(self):
         """Test that TaskCsvExporter flatten method works."""
@@ -126,6 +180,19 @@ class TestExporters(Test):
             assert key in obj_keys, key
 
 
+    @with_context
+    def test_merge_objects_with_null_user_info(self):
+        """Test that merge_objects exports a user whose info is NULL."""
+        user = UserFactory.create(info=None)
+        project = ProjectFactory.create(owner=user)
+        task = TaskFactory.create(project=project)
+        task_run = TaskRunFactory.create(task=task, user=user)
+
+        obj = TaskJsonExporter.merge_objects(task_run)
+
+        assert obj['user']['name'] == user.name
+        assert obj['user']['user_type'] is None
+
     @with_context
     @patch('pybossa.exporter.csv_export.pd.DataFrame')
     @patch('pybossa.exporter.csv_export.uploader')
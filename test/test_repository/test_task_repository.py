@@ -24,6 +24,7 @@ from factories import TaskFactory, TaskRunFactory, ProjectFactory
 from pybossa.repositories import TaskRepository, ProjectRepository
 from pybossa.exc import WrongObjectError, DBIntegrityError
 from pybossa.model.task import Task
+from sqlalchemy import inspect
 import json
 
 project_repo = ProjectRepository(db)
@@ -505,6 +506,46 @@ class TestTaskRepositoryForTaskrunQueries(Test):
             assert taskrun in task_runs
 
 
+    @with_context
+    def test_filter_task_runs_for_export(self):
+        """Test filter_task_runs_for_export returns the task runs of the
+        project ordered by id"""
+
+        project = ProjectFactory.create()
+        task_runs = TaskRunFactory.create_batch(3, project=project)
+        other_task_run = TaskRunFactory.create()
+
+        retrieved_task_runs = list(
+            self.task_repo.filter_task_runs_for_export(project.id))
+
+        assert retrieved_task_runs == task_runs, retrieved_task_runs
+        assert other_task_run not in retrieved_task_runs
+        ids = [task_run.id for task_run in retrieved_task_runs]
+        assert ids == sorted(ids), ids
+
+
+    @with_context
+    def test_filter_task_runs_for_export_expanded(self):
+        """Test filter_task_runs_for_export with expanded=True eager-loads
+        the joined task and user, so reading them issues no extra SELECTs"""
+
+        project = ProjectFactory.create()
+        TaskRunFactory.create_batch(2, project=project)
+
+        db.session.expire_all()
+        task_runs = list(self.task_repo.filter_task_runs_for_export(project.id))
+        for task_run in task_runs:
+            unloaded = inspect(task_run).unloaded
+            assert 'task' in unloaded and 'user' in unloaded, unloaded
+
+        db.session.expire_all()
+        task_runs = list(self.task_repo.filter_task_runs_for_export(
+            project.id, expanded=True))
+        for task_run in task_runs:
+            unloaded = inspect(task_run).unloaded
+            assert 'task' not in unloaded and 'user' not in unloaded, unloaded
+
+
     @with_context
     def test_filter_tasks_runs_limit_offset(self):
         """Test that filter_tasks_by supports limit and offset options"""
@@ -25,6 +25,7 @@ from factories import UserFactory, ProjectFactory, TaskFactory
 import calendar
 import time
 import csv
+import cStringIO
 import tempfile
 import os
 import json
@@ -562,6 +563,24 @@ class TestPybossaUtil(Test):
                 for item in row:
                     assert item in fake_csv[0], err_msg
 
+    def test_DirectUnicodeWriter(self):
+        """Test DirectUnicodeWriter writes the same bytes as UnicodeWriter."""
+        rows = [[u'Straße auslösen', 'plain', {'i': 1}, None, 42, True],
+                [u'中國的', u'“Hello”', 3.5, '', u'', 0]]
+
+        legacy_out = cStringIO.StringIO()
+        legacy = util.UnicodeWriter(legacy_out)
+        for row in rows:
+            legacy.writerow(row)
+
+        direct_out = cStringIO.StringIO()
+        direct = util.DirectUnicodeWriter(direct_out)
+        direct.writerow(rows[0])
+        direct.writerows(rows[1:])
+
+        err_msg = "Both writers should produce the same CSV bytes"
+        assert direct_out.getvalue() == legacy_out.getvalue(), err_msg
+
     @with_context
     def csv_validate_required_fields(self, config, callback):
         """Test validate_required_fields against csv data